@@ -0,0 +1,157 @@
+"""
+Runs one ICD9, ICD10 or Converter method over many codes on a thread or process pool.
+
+ICD9, ICD10 and Converter instances are read only once constructed: every lookup reads
+the tables loaded in __init__ and builds its own output, so one instance can be shared by
+any number of threads. Lookups return new lists, never the ones stored in the tables.
+The one thing not safe to do while other threads query is changing errorHandle.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+"""
+Default for map(): exceptions raised for a code, like Converter's "cannot be converted", are raised
+"""
+RAISE = object()
+
+"""
+Inputs smaller than this run in the calling thread, a pool only adds latency for them.
+Everything runs in the calling thread on single core hosts too.
+"""
+DEFAULT_CHUNK_SIZE = 2048
+
+# the instance a process pool worker queries, set once when the worker starts
+_worker_target = None
+
+
+"""
+Returns: <bool> whether this is a free threaded build running with the GIL disabled
+"""
+def free_threaded():
+    try:
+        return not sys._is_gil_enabled()
+    except AttributeError:
+        return False
+
+
+def _init_worker(target):
+    global _worker_target
+    _worker_target = target
+
+
+def _run_chunk(target, method, codes, args, default):
+    if target is None:
+        target = _worker_target
+    method = getattr(target, method)
+
+    output = []
+    if default is RAISE:
+        for code in codes:
+            output.append(method(code, *args))
+    else:
+        for code in codes:
+            try:
+                output.append(method(code, *args))
+            except Exception:
+                output.append(default)
+    return output
+
+
+class BatchExecutor:
+    """
+    Splits a list of codes into chunks, runs a lookup method over the chunks on a pool
+    and returns the results in input order.
+
+    batch = BatchExecutor(Converter(), workers=8)
+    batch.map('convert_10_9', codes, default=None)
+    batch.map('abstract', codes, 3)          # extra arguments are passed to every call
+
+    mode
+    "inline" - run every chunk in the calling thread
+    "thread" - share target between threads, only faster than one thread on free threaded builds
+    "process" - copy target into each worker process once, results are sent back per chunk.
+                A lookup takes a few microseconds, about what it costs to pickle its result,
+                so measure it with benchmarks.suite --executor before using it
+    "auto" - threads when the GIL is disabled, inline otherwise.
+             With the GIL neither pool is faster than inline, see the README
+    """
+    def __init__(self, target, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, mode="auto"):
+        if mode == "auto":
+            mode = "thread" if free_threaded() else "inline"
+        if mode not in ("inline", "thread", "process"):
+            raise Exception('BatchExecutor() mode must be "inline", "thread", "process" or "auto"')
+
+        try:
+            chunk_size = int(chunk_size)
+        except ValueError:
+            raise Exception('BatchExecutor() chunk_size must be integer')
+
+        self.target = target
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.mode = mode
+        self.__pool = None
+
+
+    def __pool_for(self):
+        if self.__pool is None:
+            if self.mode == "thread":
+                self.__pool = ThreadPoolExecutor(self.workers)
+            else:
+                # the target is sent to each worker once, not with every chunk
+                self.__pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                  initargs=(self.target,))
+        return self.__pool
+
+
+    """
+    Input: <string> method name, <list> codes, any extra arguments for the method
+           default - returned in place of a result when the method raises, raises by default
+    Returns: <list> method(code, *args) for every code, in input order
+    """
+    def map(self, method, codes, *args, **kwargs):
+        default = kwargs.pop('default', RAISE)
+        if kwargs:
+            raise Exception('BatchExecutor.map() got unexpected arguments %s' % ', '.join(kwargs))
+
+        if not hasattr(self.target, method) or method.startswith('_'):
+            raise Exception('%s is not a %s method' % (method, type(self.target).__name__))
+
+        codes = list(codes)
+        if self.runs_inline(len(codes)):
+            return _run_chunk(self.target, method, codes, args, default)
+
+        # process workers use their own copy of the target
+        target = self.target if self.mode == "thread" else None
+        chunks = [codes[i:i + self.chunk_size] for i in range(0, len(codes), self.chunk_size)]
+        futures = [self.__pool_for().submit(_run_chunk, target, method, chunk, args, default)
+                   for chunk in chunks]
+
+        output = []
+        for future in futures:
+            output += future.result()
+        return output
+
+
+    """
+    Input: <int> number of codes
+    Returns: <bool> whether map() over that many codes runs in the calling thread instead of the pool
+    """
+    def runs_inline(self, n):
+        return self.mode == "inline" or n <= self.chunk_size or (self.workers or os.cpu_count() or 1) <= 1
+
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
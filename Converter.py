@@ -1,41 +1,63 @@
 import json
 from six import string_types
 
+from . import Memory
+
 
 class Converter:
-    def __init__(self):
+    def __init__(self, data_path=None, low_memory=False):
         import os
-        dir_path = os.path.dirname(os.path.realpath(__file__))
+        if data_path is None:
+            data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'DxCodeHandler data')
 
         """
         Load all our known ICD10 codes into a set for cross reference
         """
-        self.__all_icd10 = json.load(open(dir_path + '/DxCodeHandler data/icd10/depths.json'))
+        self.__all_icd10 = json.load(open(data_path + '/icd10/depths.json'))
         self.__all_icd10 = set(self.__all_icd10.keys())
 
         """
         Load all our known ICD9 codes into a set for cross reference
         """
-        self.__all_icd9  = json.load(open(dir_path + '/DxCodeHandler data/icd9/depths2.json'))
+        self.__all_icd9  = json.load(open(data_path + '/icd9/depths2.json'))
         self.__all_icd9  = set(self.__all_icd9.keys())
 
         """
         Load all mappings from ICD10 to ICD9 including GEM files and CUI mapped codes
         """
-        self.__icd10_2_icd9 = json.load(open(dir_path + '/DxCodeHandler data/conversions/icd10_2_icd9_conversion_2017.json'))
-        self.__icd10_cui_icd9 = json.load(open(dir_path + '/DxCodeHandler data/conversions/icd10_cui_icd9.json'))
+        self.__icd10_2_icd9 = json.load(open(data_path + '/conversions/icd10_2_icd9_conversion_2017.json'))
+        self.__icd10_cui_icd9 = json.load(open(data_path + '/conversions/icd10_cui_icd9.json'))
 
         """
         Load all mappings from ICD9 to ICD10 including GEM files and CUI mapped code
         """
-        self.__icd9_2_icd10 = json.load(open(dir_path + '/DxCodeHandler data/conversions/icd9_2_icd10_conversion.json'))
-        self.__icd9_cui_icd10 = json.load(open(dir_path + '/DxCodeHandler data/conversions/icd9_cui_icd10.json'))
+        self.__icd9_2_icd10 = json.load(open(data_path + '/conversions/icd9_2_icd10_conversion.json'))
+        self.__icd9_cui_icd10 = json.load(open(data_path + '/conversions/icd9_cui_icd10.json'))
 
         """
         Load all mappings from 2016 ICD10 to 2017 ICD10
         This will have to be updated on an annual basis.
         """
-        self.__icd10_conversion_table = json.load(open(dir_path + '/DxCodeHandler data/conversions/2017_conversion_table.json'))
+        self.__icd10_conversion_table = json.load(open(data_path + '/conversions/2017_conversion_table.json'))
+
+        """
+        In low memory mode every code is interned, so codes are shared with ICD9 and ICD10
+        instances and between the tables here, and identical target lists are stored once
+        """
+        self.low_memory = low_memory
+        if low_memory:
+            self.__all_icd10 = set(Memory.intern_code(c) for c in self.__all_icd10)
+            self.__all_icd9 = set(Memory.intern_code(c) for c in self.__all_icd9)
+            self.__icd10_2_icd9 = Memory.intern_lists(self.__icd10_2_icd9)
+            self.__icd10_cui_icd9 = Memory.intern_lists(self.__icd10_cui_icd9)
+            self.__icd9_2_icd10 = Memory.intern_lists(self.__icd9_2_icd10)
+            self.__icd9_cui_icd10 = Memory.intern_lists(self.__icd9_cui_icd10)
+            self.__icd10_conversion_table = Memory.intern_table(self.__icd10_conversion_table)
+
+        """
+        Set by Instrumentation.instrument() to count which table answered each conversion
+        """
+        self.instrumentation = None
 
 
     def __isICD10Code(self, code):
@@ -66,6 +88,8 @@ class Converter:
         change = False
         if self.__icd10_mapped(code):
             code = self.__icd10_mapped(code)
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_10_9', 'remap')
 
         try:
             self.__isICD10Code(code)
@@ -79,18 +103,26 @@ class Converter:
             pass
 
         if code[0] == "NoD.x":
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_10_9', 'no_dx')
             raise Exception('%s has No Dx equivalent in ICD9' % old_code)
         elif change:
-            return code
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_10_9', 'gem')
+            return list(code)
         else:
             pass
 
         try:
             code = self.__icd10_cui_icd9[code]
-            return code
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_10_9', 'cui')
+            return list(code)
         except KeyError:
             pass
 
+        if self.instrumentation is not None:
+            self.instrumentation.record_path('Converter.convert_10_9', 'failure')
         raise Exception('%s cannot be converted to ICD9' % code)
 
 
@@ -116,18 +148,26 @@ class Converter:
             pass
 
         if code[0] == "NoD.x":
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_9_10', 'no_dx')
             raise Exception('%s has No Dx equivalent in ICD10' % old_code)
         elif change:
-            return code
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_9_10', 'gem')
+            return list(code)
         else:
             pass
 
         try:
             code = self.__icd9_cui_icd10[code]
-            return code
+            if self.instrumentation is not None:
+                self.instrumentation.record_path('Converter.convert_9_10', 'cui')
+            return list(code)
         except KeyError:
             pass
 
+        if self.instrumentation is not None:
+            self.instrumentation.record_path('Converter.convert_9_10', 'failure')
         raise Exception('%s cannot be converted to ICD10' % code)
 
     """
@@ -139,4 +179,19 @@ class Converter:
         try:
             return self.__icd10_conversion_table[code]
         except KeyError:
-            return None
\ No newline at end of file
+            return None
+
+    """
+    Returns: <dict> bytes used by each table and their total
+    Codes shared between tables are counted once, for the first table that holds them
+    """
+    def memory_report(self):
+        return Memory.report([
+            ('all_icd10', self.__all_icd10),
+            ('all_icd9', self.__all_icd9),
+            ('icd10_2_icd9', self.__icd10_2_icd9),
+            ('icd10_cui_icd9', self.__icd10_cui_icd9),
+            ('icd9_2_icd10', self.__icd9_2_icd10),
+            ('icd9_cui_icd10', self.__icd9_cui_icd10),
+            ('icd10_conversion_table', self.__icd10_conversion_table),
+        ])
@@ -1,18 +1,35 @@
 import json
 from six import string_types
 
+from . import Memory
+
 class ICD10:
 
-    def __init__(self, errorHandle="NoDx"):
+    def __init__(self, errorHandle="NoDx", data_path=None, low_memory=False):
         import os
-        dir_path = os.path.dirname(os.path.realpath(__file__))
+        if data_path is None:
+            data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'DxCodeHandler data')
         self.errorHandle = errorHandle
-
-        self.__parents = json.load(open(dir_path + '/DxCodeHandler data/icd10/parents.json'))
-        self.__depths = json.load(open(dir_path + '/DxCodeHandler data/icd10/depths.json'))
-        self.__descriptions = json.load(open(dir_path + '/DxCodeHandler data/icd10/descriptions.json'))
-        self.__descendants = json.load(open(dir_path + '/DxCodeHandler data/icd10/descendants.json'))
-        self.__children = json.load(open(dir_path + '/DxCodeHandler data/icd10/children.json'))
+        self.low_memory = low_memory
+
+        self.__parents = json.load(open(data_path + '/icd10/parents.json'))
+        self.__depths = json.load(open(data_path + '/icd10/depths.json'))
+        self.__descriptions = json.load(open(data_path + '/icd10/descriptions.json'))
+        self.__children = json.load(open(data_path + '/icd10/children.json'))
+
+        if low_memory:
+            # every code is interned once, descriptions are word coded, and descendants are
+            # walked from the children on request except for the few codes whose stored
+            # descendants the children table does not reproduce
+            shared = {}
+            self.__parents = Memory.intern_table(self.__parents, shared)
+            self.__children = Memory.intern_table(self.__children, shared)
+            self.__depths = Memory.intern_table(self.__depths, shared)
+            self.__descriptions = Memory.CompressedStrings(self.__descriptions)
+            self.__descendants = Memory.descendant_overrides(
+                self.__children, json.load(open(data_path + '/icd10/descendants.json')), self.__depths)
+        else:
+            self.__descendants = json.load(open(data_path + '/icd10/descendants.json'))
 
 
     """
@@ -155,6 +172,16 @@ class ICD10:
 
         code = code.upper()
         temp = [code]
+        if self.low_memory:
+            try:
+                descendants = self.__descendants[code]
+            except KeyError:
+                return temp + Memory.descendants(self.__children, code)
+            if descendants is None:
+                return None
+            temp += descendants
+            return temp
+
         try:
             temp += self.__descendants[code]
             return temp
@@ -280,7 +307,8 @@ class ICD10:
             code = self.__parents[code]
             cur_depth = self.__depths[code]
             codes.append(code)
-        return list(reversed(codes))
+        codes.reverse()
+        return codes
 
 
     def isLeafNode(self, code):
@@ -294,3 +322,13 @@ class ICD10:
             return False
         else:
             return True
+
+
+    def memory_report(self):
+        return Memory.report([
+            ('depths', self.__depths),
+            ('parents', self.__parents),
+            ('children', self.__children),
+            ('descendants', self.__descendants),
+            ('descriptions', self.__descriptions),
+        ])
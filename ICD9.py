@@ -1,25 +1,45 @@
 import json
 from six import string_types
 
+from . import Memory
+
 class ICD9:
     """
     The ICD9 class captures the hierarchy and descriptions for the ICD9 coding standard
     The source data files were developed from CMS mapping files
     """
-    def __init__(self, errorHandle="NoDx"):
+    def __init__(self, errorHandle="NoDx", data_path=None, low_memory=False):
         '''
         Loads the dependancies for the ICD9 class
         All the mapping data is stored in JSON files which are loaded into dicts
+        data_path - directory laid out like "DxCodeHandler data", defaults to the packaged data
+        low_memory - share code strings between tables, compress descriptions and
+                     compute descendants when asked instead of storing them
         '''
         import os
-        dir_path = os.path.dirname(os.path.realpath(__file__))
+        if data_path is None:
+            data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'DxCodeHandler data')
         self.errorHandle = errorHandle
-
-        self.__descriptions = json.load(open(dir_path + '/DxCodeHandler data/icd9/descriptions5.json'))
-        self.__descendants = json.load(open(dir_path + '/DxCodeHandler data/icd9/descendants2.json'))
-        self.__children = json.load(open(dir_path +   '/DxCodeHandler data/icd9/children.json'))
-        self.__parents = json.load(open(dir_path +   '/DxCodeHandler data/icd9/parents2.json'))
-        self.__depths = json.load(open(dir_path +   '/DxCodeHandler data/icd9/depths2.json'))
+        self.low_memory = low_memory
+
+        self.__descriptions = json.load(open(data_path + '/icd9/descriptions5.json'))
+        self.__children = json.load(open(data_path + '/icd9/children.json'))
+        self.__parents = json.load(open(data_path + '/icd9/parents2.json'))
+        self.__depths = json.load(open(data_path + '/icd9/depths2.json'))
+
+        if low_memory:
+            # every code is interned once, descriptions are word coded, and descendants are
+            # walked from the children on request except for the few codes whose stored
+            # descendants the children table does not reproduce
+            shared = {}
+            self.__parents = Memory.intern_table(self.__parents, shared)
+            self.__children = Memory.intern_table(self.__children, shared)
+            self.__depths = Memory.intern_table(self.__depths, shared)
+            self.__descriptions = Memory.CompressedStrings(self.__descriptions)
+            self.__descendants = Memory.descendant_overrides(
+                self.__children, json.load(open(data_path + '/icd9/descendants2.json')), self.__depths)
+        else:
+            self.__descendants = json.load(open(data_path + '/icd9/descendants2.json'))
 
 
     """
@@ -187,6 +207,13 @@ class ICD9:
 
         code = code.upper()
 
+        if self.low_memory:
+            try:
+                descendants = self.__descendants[code]
+            except KeyError:
+                return Memory.descendants(self.__children, code)
+            return descendants
+
         try:
             return self.__descendants[code]
         except KeyError:
@@ -326,7 +353,8 @@ class ICD9:
             code = self.__parents[code]
             cur_depth = self.__depths[code]
             codes.append(code)
-        return list(reversed(codes))
+        codes.reverse()
+        return codes
 
 
 
@@ -342,3 +370,17 @@ class ICD9:
             return False
         else:
             return True
+
+
+    '''
+    Returns: <dict> bytes used by each table and their total
+    Codes shared between tables are counted once, for the first table that holds them
+    '''
+    def memory_report(self):
+        return Memory.report([
+            ('depths', self.__depths),
+            ('parents', self.__parents),
+            ('children', self.__children),
+            ('descendants', self.__descendants),
+            ('descriptions', self.__descriptions),
+        ])
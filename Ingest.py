@@ -0,0 +1,309 @@
+"""
+Builds the runtime conversion and description tables loaded by Converter and ICD9
+straight from the raw CMS release files.
+
+python -m DxCodeHandler.Ingest /path/to/release /path/to/output
+python -m DxCodeHandler.Ingest --in-place                   # rebuild the packaged data
+
+Each source file is read once, line by line. A manifest of the source files used
+is kept next to the outputs so only the tables whose source changed are rebuilt.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import unicodedata
+
+
+MANIFEST = 'ingest_manifest.json'
+
+PACKAGED_DATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'DxCodeHandler data')
+
+"""
+Descriptions of the ICD9 chapter, range and category codes, which the CMS files leave out
+"""
+HEADER_DESCRIPTIONS = 'icd9/header_descriptions.json'
+
+"""
+The 2017 ICD10 codes. A previous code that is still one of them is not renamed,
+the conversion table lists it because it used to be coded together with others.
+"""
+ICD10_CODES = 'icd10/depths.json'
+
+ICD10_CODE = re.compile(r'^[A-Z][0-9][0-9A-Z](\.[0-9A-Z]{1,4})?$')
+
+
+"""
+Positions of the flags in the five digit flag field of a CMS GEM record
+"""
+APPROXIMATE = 0
+NO_MAP = 1
+COMBINATION = 2
+SCENARIO = 3
+CHOICE_LIST = 4
+
+
+"""
+Input: <string> undotted icd9 diagnosis code as written in the CMS files
+Returns: <string> the dotted code used throughout the package
+"""
+def dot_icd9(code):
+    # E codes have four characters before the decimal, numeric and V codes three
+    stem = 4 if code.startswith('E') else 3
+    if len(code) <= stem:
+        return code
+    return code[:stem] + '.' + code[stem:]
+
+
+"""
+Input: <string> undotted icd10 code as written in the CMS files
+Returns: <string> the dotted code used throughout the package
+"""
+def dot_icd10(code):
+    if len(code) <= 3:
+        return code
+    return code[:3] + '.' + code[3:]
+
+
+def read_gem(path, source_format, target_format):
+    """
+    Yields (source, target, flags) for every record of a CMS GEM file.
+    No map records have the target "NoD.x", the marker Converter looks for.
+    """
+    with io.open(path, encoding='latin-1') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 3:
+                continue
+            source, target, flags = fields
+            if flags[NO_MAP] == '1':
+                target = 'NoD.x'
+            else:
+                target = target_format(target)
+            yield source_format(source), target, flags
+
+
+def build_gem(path, source_format, target_format):
+    """
+    Returns the conversion table {source: [targets]} and the matching flags table
+    {source: [flags]}, where flags[i] is the five digit CMS flag field for targets[i].
+    Repeated targets, which CMS lists once per combination scenario, are kept once.
+    """
+    table = {}
+    flags = {}
+    for source, target, flag in read_gem(path, source_format, target_format):
+        try:
+            targets = table[source]
+        except KeyError:
+            targets = table[source] = []
+            flags[source] = []
+        if target not in targets:
+            targets.append(target)
+            flags[source].append(flag)
+    return table, flags
+
+
+def build_icd9_2_icd10(path):
+    table, flags = build_gem(path, dot_icd9, dot_icd10)
+    return {
+        'conversions/icd9_2_icd10_conversion.json': table,
+        'conversions/icd9_2_icd10_flags.json': flags,
+    }
+
+
+def build_icd10_2_icd9(path):
+    table, flags = build_gem(path, dot_icd10, dot_icd9)
+    return {
+        'conversions/icd10_2_icd9_conversion_2017.json': table,
+        'conversions/icd10_2_icd9_flags_2017.json': flags,
+    }
+
+
+def _expand_range(first, last):
+    """
+    Returns every code from first to last when they differ only in their final character,
+    "I60.20-I60.22" gives I60.20, I60.21 and I60.22, and [] for wider ranges like "Y93.01-Y93.9"
+    """
+    if len(first) != len(last) or first[:-1] != last[:-1] or first[-1] > last[-1]:
+        return []
+    return [first[:-1] + chr(c) for c in range(ord(first[-1]), ord(last[-1]) + 1)]
+
+
+def build_icd10_conversion_table(path):
+    """
+    Reads the NCHS ICD10 conversion table, tab separated rows of
+    current code, effective year, previous codes
+    Previous codes are separated by "," or ";" and ranges are expanded. Rows joined with "and"
+    mean the current code replaces that combination of codes, which are not renamed, so they
+    are skipped, as are previous codes still in the 2017 ontology and entries that are not codes
+    ("None", "Code from categories T36-T50").
+    Returns {previous code: current code}, later rows win when a previous code was split
+    """
+    with open(os.path.join(PACKAGED_DATA, ICD10_CODES)) as f:
+        current_codes = json.load(f)
+
+    table = {}
+    with io.open(path, encoding='latin-1') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) < 3 or not fields[1].strip().isdigit():
+                continue
+            current = fields[0].strip()
+            previous_codes = fields[2].strip().strip('"')
+            if re.search(r'\sand\s', previous_codes, flags=re.IGNORECASE):
+                continue
+            for previous in re.split(r'[,;]', previous_codes):
+                ends = [end.strip() for end in previous.split('-')]
+                if not all(ICD10_CODE.match(end) for end in ends):
+                    continue
+                if len(ends) == 2:
+                    ends = _expand_range(*ends)
+                elif len(ends) != 1:
+                    continue
+                for code in ends:
+                    if code not in current_codes:
+                        table[code] = current
+    return {'conversions/2017_conversion_table.json': table}
+
+
+def format_description(description):
+    """
+    Returns a CMS description in the style of the packaged descriptions5.json, which
+    ICD9.description() has always returned: accents folded to ASCII, ", not elsewhere classified"
+    dropped, and every word lower case with the first letter of words longer than three
+    characters capitalized. "Drug induced headache, not elsewhere classified" -> "Drug Induced Headache"
+    """
+    description = unicodedata.normalize('NFKD', description).encode('ascii', 'ignore').decode('ascii')
+    description = description.replace(', not elsewhere classified', '').lower()
+    return ' '.join(word[0].upper() + word[1:] if len(word) > 3 else word
+                    for word in description.split(' '))
+
+
+def build_icd9_descriptions(path):
+    """
+    Reads a CMS long description file, an undotted code and its description per line.
+    The chapter, range and category descriptions CMS leaves out come from the packaged
+    HEADER_DESCRIPTIONS, so the output depends only on these two files.
+    """
+    with open(os.path.join(PACKAGED_DATA, HEADER_DESCRIPTIONS)) as f:
+        descriptions = json.load(f)
+    with io.open(path, encoding='latin-1') as f:
+        for line in f:
+            code, _, description = line.strip().partition(' ')
+            if code:
+                descriptions[dot_icd9(code)] = format_description(description.strip())
+    return {'icd9/descriptions5.json': descriptions}
+
+
+"""
+(step name, source file, builder) in the order they are run.
+Every builder takes the source file and returns {output file: table}.
+Paths are relative to the source and output directories, which are laid out like "DxCodeHandler data".
+"""
+STEPS = [
+    ('icd9_2_icd10', 'conversions/2015_I9gem.txt', build_icd9_2_icd10),
+    ('icd10_2_icd9', 'conversions/2017_I10gem.txt', build_icd10_2_icd9),
+    ('icd10_conversion_table', 'icd9/icd10cm-conversiontablefy17.txt', build_icd10_conversion_table),
+    ('icd9_descriptions', 'icd9/CMS32_DESC_LONG_DX.txt', build_icd9_descriptions),
+]
+
+
+def _fingerprint(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest.hexdigest()}
+
+
+def _unchanged(path, previous):
+    if not previous:
+        return False
+    stat = os.stat(path)
+    if stat.st_size == previous['size'] and stat.st_mtime == previous['mtime']:
+        return True
+    # touched but possibly identical, fall back to the content hash
+    return stat.st_size == previous['size'] and _fingerprint(path)['sha1'] == previous['sha1']
+
+
+def _write(path, table):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # write then rename so a reader never loads a half written table
+    with open(path + '.tmp', 'w') as f:
+        json.dump(table, f, separators=(',', ':'), sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+
+def build(source_path=None, output_path=None, force=False, steps=None, in_place=False):
+    """
+    Input: <string> directory holding the CMS release files, defaults to the packaged data
+           <string> directory to write the tables to
+           <bool> rebuild every table even if its source did not change
+           <list> names of the steps to run, defaults to all of STEPS
+           <bool> write the tables into source_path, required instead of output_path
+                  so the packaged data is never rewritten by accident
+    Returns: <list> the names of the steps that were rebuilt
+    """
+    if source_path is None:
+        source_path = PACKAGED_DATA
+    if in_place:
+        output_path = source_path
+    elif output_path is None:
+        raise Exception('Ingest.build() needs an output_path, or in_place=True to overwrite %s' % source_path)
+
+    manifest_path = os.path.join(output_path, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    rebuilt = []
+    for name, source, builder in STEPS:
+        if steps is not None and name not in steps:
+            continue
+
+        path = os.path.join(source_path, source)
+        if not os.path.exists(path):
+            raise Exception('%s is missing, needed to build %s' % (path, name))
+
+        previous = manifest.get(name, {})
+        outputs_exist = all(os.path.exists(os.path.join(output_path, o)) for o in previous.get('outputs', []))
+        if not force and outputs_exist and _unchanged(path, previous.get('source')):
+            continue
+
+        tables = builder(path)
+        for output, table in tables.items():
+            _write(os.path.join(output_path, output), table)
+
+        manifest[name] = {'source': _fingerprint(path), 'outputs': sorted(tables)}
+        rebuilt.append(name)
+
+    if rebuilt:
+        _write(manifest_path, manifest)
+    return rebuilt
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Build conversion and description tables from CMS files')
+    parser.add_argument('source', nargs='?', help='directory of CMS files laid out like "DxCodeHandler data"')
+    parser.add_argument('output', nargs='?', help='where to write the tables')
+    parser.add_argument('--in-place', action='store_true', help='write the tables into the source directory')
+    parser.add_argument('--force', action='store_true', help='rebuild every table')
+    parser.add_argument('--steps', help='comma separated subset of %s' % ','.join(s[0] for s in STEPS))
+    args = parser.parse_args(argv)
+
+    if args.output is None and not args.in_place:
+        parser.error('give an output directory, or --in-place to overwrite the source tables')
+
+    steps = args.steps.split(',') if args.steps else None
+    rebuilt = build(args.source, args.output, args.force, steps, args.in_place)
+    print('rebuilt: %s' % (', '.join(rebuilt) if rebuilt else 'nothing, all tables up to date'))
+
+
+if __name__ == '__main__':
+    main()
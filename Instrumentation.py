@@ -0,0 +1,206 @@
+import bisect
+import threading
+import time
+
+
+"""
+Upper bounds in seconds of the latency histogram buckets, the last bucket counts everything slower
+"""
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1)
+
+"""
+Public methods wrapped by instrument() for each class
+"""
+METHODS = {
+    'ICD9': ('isCode', 'parent', 'children', 'descendants', 'depth', 'description',
+             'abstract', 'ancestors', 'isLeafNode', 'getAllCodes'),
+    'ICD10': ('isCode', 'parent', 'children', 'descendants', 'depth', 'description',
+              'abstract', 'ancestors', 'isLeafNode', 'getAllCodes'),
+    'Converter': ('convert_9_10', 'convert_10_9'),
+}
+
+"""
+Ways Converter can answer a conversion
+gem - found in the CMS GEM table
+cui - found in the CUI fallback table
+no_dx - the GEM says there is no equivalent, raises
+failure - found in neither table, raises
+remap - the code was first renamed from its 2016 to its 2017 ICD10 code, counted on top of the others
+"""
+CONVERSION_PATHS = ('gem', 'cui', 'no_dx', 'failure', 'remap')
+
+
+class Instrumentation:
+    """
+    Collects per method call counts, latency histograms, invalid code counts and
+    conversion path counts from instrumented ICD9, ICD10 and Converter instances.
+
+    Nothing is recorded, and nothing is slowed down, until an instance is passed to instrument().
+
+    from DxCodeHandler import Instrumentation
+    icd9 = Instrumentation.instrument(ICD9())
+    ...
+    Instrumentation.snapshot()
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.reset()
+
+
+    def reset(self):
+        with self.__lock:
+            self.__methods = {}
+            self.__paths = {}
+
+
+    """
+    Input: <string> method name, <float> seconds, <int> invalid codes, <bool> raised an exception
+    """
+    def record(self, name, seconds, invalid=0, failed=False):
+        with self.__lock:
+            try:
+                stats = self.__methods[name]
+            except KeyError:
+                stats = self.__methods[name] = {
+                    'calls': 0,
+                    'invalid': 0,
+                    'exceptions': 0,
+                    'total_seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'histogram': [0] * (len(self.buckets) + 1),
+                }
+
+            stats['calls'] += 1
+            stats['invalid'] += invalid
+            stats['exceptions'] += failed
+            stats['total_seconds'] += seconds
+            if seconds > stats['max_seconds']:
+                stats['max_seconds'] = seconds
+            stats['histogram'][bisect.bisect_left(self.buckets, seconds)] += 1
+
+
+    """
+    Input: <string> conversion method name, <string> one of CONVERSION_PATHS
+    """
+    def record_path(self, name, path):
+        with self.__lock:
+            try:
+                paths = self.__paths[name]
+            except KeyError:
+                paths = self.__paths[name] = dict((p, 0) for p in CONVERSION_PATHS)
+            paths[path] += 1
+
+
+    """
+    Returns: <dict> a copy of everything recorded since the last reset, safe to serialise as JSON
+    invalid_rate is invalid codes per call, list inputs can have more than one invalid code per call
+    """
+    def snapshot(self, reset=False):
+        with self.__lock:
+            methods = {}
+            for name, stats in self.__methods.items():
+                stats = dict(stats, histogram=list(stats['histogram']))
+                stats['mean_seconds'] = stats['total_seconds'] / stats['calls']
+                stats['invalid_rate'] = float(stats['invalid']) / stats['calls']
+                methods[name] = stats
+            output = {
+                'buckets': list(self.buckets),
+                'methods': methods,
+                'conversions': dict((name, dict(paths)) for name, paths in self.__paths.items()),
+            }
+            if reset:
+                self.__methods = {}
+                self.__paths = {}
+        return output
+
+
+    def wrap(self, name, method):
+        local = self.__local
+        record = self.record
+
+        def timed(*args, **kwargs):
+            # only the outermost call is timed, isLeafNode calling children() counts once
+            if getattr(local, 'active', False):
+                return method(*args, **kwargs)
+
+            local.active = True
+            local.invalid = 0
+            failed = False
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                seconds = time.perf_counter() - start
+                local.active = False
+                record(name, seconds, local.invalid, failed)
+
+        timed.__name__ = method.__name__
+        timed.__doc__ = method.__doc__
+        return timed
+
+
+    def wrap_error(self, method):
+        local = self.__local
+
+        def counted(code):
+            if getattr(local, 'active', False):
+                local.invalid += 1
+            return method(code)
+
+        return counted
+
+
+"""
+The Instrumentation used when instrument() is not given one
+"""
+default = Instrumentation()
+
+
+"""
+Input: an ICD9, ICD10 or Converter instance, optionally the Instrumentation to record into
+Returns: the same instance, now recording every public method call
+"""
+def instrument(obj, instrumentation=None):
+    if instrumentation is None:
+        instrumentation = default
+
+    name = type(obj).__name__
+    if name not in METHODS:
+        raise Exception('%s cannot be instrumented' % name)
+
+    uninstrument(obj)
+    for method in METHODS[name]:
+        setattr(obj, method, instrumentation.wrap('%s.%s' % (name, method), getattr(obj, method)))
+
+    if name == 'Converter':
+        obj.instrumentation = instrumentation
+    else:
+        obj.handleError = instrumentation.wrap_error(obj.handleError)
+    return obj
+
+
+"""
+Input: an instance passed to instrument()
+Returns: the same instance with the original, unrecorded methods
+"""
+def uninstrument(obj):
+    name = type(obj).__name__
+    for method in METHODS.get(name, ()) + ('handleError',):
+        # the wrappers live on the instance and shadow the class methods
+        obj.__dict__.pop(method, None)
+    if name == 'Converter':
+        obj.instrumentation = None
+    return obj
+
+
+def snapshot(reset=False):
+    return default.snapshot(reset)
+
+
+def reset():
+    default.reset()
@@ -0,0 +1,167 @@
+"""
+Helpers behind the low_memory mode of ICD9, ICD10 and Converter, and the memory reports.
+"""
+import bisect
+import sys
+from array import array
+
+
+"""
+Input: <string> any code
+Returns: <string> the one shared copy of the code.
+sys.intern is process wide, so ICD9, ICD10 and Converter instances all share their code strings.
+"""
+def intern_code(code):
+    return sys.intern(str(code))
+
+
+"""
+Input: <dict> code -> code, code -> list of codes or code -> any other value
+Returns: <dict> the same mapping with every code interned.
+Lists of codes are turned into tuples, and equal tuples are shared between keys.
+"""
+def intern_table(table, shared=None):
+    if shared is None:
+        shared = {}
+    output = {}
+    for key, value in table.items():
+        if isinstance(value, list):
+            value = tuple(intern_code(v) if v is not None else v for v in value)
+            value = shared.setdefault(value, value)
+        elif isinstance(value, str):
+            value = intern_code(value)
+        output[intern_code(key)] = value
+    return output
+
+
+"""
+Input: <dict> code -> list of codes
+Returns: <dict> the same mapping with every code interned and equal lists shared between keys.
+Unlike intern_table the values stay lists, for tables whose lists are returned to the caller.
+"""
+def intern_lists(table):
+    shared = {}
+    output = {}
+    for key, value in table.items():
+        value = [intern_code(v) for v in value]
+        output[intern_code(key)] = shared.setdefault(tuple(value), value)
+    return output
+
+
+"""
+Input: <dict> code -> children, <string> code
+Returns: <list> every code below code in breadth first order, the order the descendants tables are stored in
+"""
+def descendants(children, code):
+    output = []
+    queue = list(children.get(code, ()))
+    i = 0
+    while i < len(queue):
+        output.append(queue[i])
+        queue.extend(children.get(queue[i], ()))
+        i += 1
+    return output
+
+
+"""
+Input: <dict> code -> children, <dict> code -> stored descendants, every code of the ontology
+Returns: <dict> code -> interned tuple of descendants, or None when no list is stored,
+for only the codes where walking the children does not give back the stored answer.
+The packaged children tables are missing a few links, e.g. ICD9 E979 has no children entry.
+"""
+def descendant_overrides(children, stored, codes):
+    overrides = {}
+    for code in codes:
+        expected = stored.get(code)
+        if expected is None or descendants(children, code) != expected:
+            overrides[intern_code(code)] = tuple(intern_code(c) for c in expected) if expected is not None else None
+    return overrides
+
+
+class CompressedStrings:
+    """
+    A read only code -> description mapping that keeps descriptions word coded.
+    Every distinct word is stored once and each description is a run of word numbers
+    in one packed array, looked up by bisecting a sorted tuple of the codes.
+    Decoding a description costs a couple of microseconds on access.
+    """
+    def __init__(self, table):
+        self.__keys = tuple(sorted(intern_code(key) for key in table))
+
+        numbers = {}
+        self.__words = []
+        coded = []
+        offsets = [0]
+        for key in self.__keys:
+            # split on single spaces so joining gives back the exact description
+            for word in table[key].split(' '):
+                try:
+                    coded.append(numbers[word])
+                except KeyError:
+                    numbers[word] = len(self.__words)
+                    coded.append(len(self.__words))
+                    self.__words.append(word)
+            offsets.append(len(coded))
+
+        self.__coded = array('H' if len(self.__words) <= 0xFFFF else 'L', coded)
+        self.__offsets = array('L', offsets)
+
+    def __index(self, key):
+        i = bisect.bisect_left(self.__keys, key)
+        if i == len(self.__keys) or self.__keys[i] != key:
+            raise KeyError(key)
+        return i
+
+    def __getitem__(self, key):
+        i = self.__index(key)
+        words = self.__words
+        return ' '.join([words[n] for n in self.__coded[self.__offsets[i]:self.__offsets[i + 1]]])
+
+    def __contains__(self, key):
+        try:
+            self.__index(key)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def keys(self):
+        return self.__keys
+
+    def sizeof(self, seen):
+        return (_sizeof(self.__keys, seen) + _sizeof(self.__words, seen) +
+                _sizeof(self.__coded, seen) + _sizeof(self.__offsets, seen))
+
+
+def _sizeof(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, CompressedStrings):
+        return sys.getsizeof(obj) + obj.sizeof(seen)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _sizeof(key, seen) + _sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for value in obj:
+            size += _sizeof(value, seen)
+    return size
+
+
+"""
+Input: <list> of (table name, table) pairs
+Returns: <dict> table name -> bytes used by the table and everything it holds, plus a 'total'.
+Objects shared between tables, like interned codes, are counted once for the first table holding them.
+"""
+def report(tables):
+    seen = set()
+    output = {}
+    for name, table in tables:
+        output[name] = _sizeof(table, seen)
+    output['total'] = sum(output.values())
+    return output
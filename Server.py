@@ -0,0 +1,388 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+
+from .ICD9 import ICD9
+from .ICD10 import ICD10
+from .Converter import Converter
+
+
+"""
+Methods that may be called remotely on each target.
+Anything not listed here is rejected before it reaches the ontology.
+"""
+METHODS = {
+    'icd9': ('isCode', 'parent', 'children', 'descendants', 'depth', 'description',
+             'abstract', 'ancestors', 'isLeafNode', 'getAllCodes'),
+    'icd10': ('isCode', 'parent', 'children', 'descendants', 'depth', 'description',
+              'abstract', 'ancestors', 'isLeafNode', 'getAllCodes'),
+    'converter': ('convert_9_10', 'convert_10_9'),
+}
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8739
+
+"""
+Longest request or response line in bytes, getAllCodes() on ICD10 is a little over 1 MiB
+"""
+DEFAULT_LIMIT = 64 * 1024 * 1024
+
+
+def _encode(message):
+    # sets (getAllCodes) are not JSON serialisable, send them as sorted lists
+    return (json.dumps(message, separators=(',', ':'), default=sorted) + '\n').encode('utf-8')
+
+
+def _request_id(head):
+    # the id is the first element of every message, so it can be read from the start of a cut off line
+    match = re.match(br'\s*\[\s*(-?\d+)', head)
+    return int(match.group(1)) if match else None
+
+
+async def _readline(reader):
+    """
+    Returns (line, None) for the next line, (b'', None) at the end of the stream, or
+    (None, start of the line) when the line is longer than the reader's limit.
+    The rest of an oversized line is skipped so the stream can carry on with the next one.
+    """
+    try:
+        return await reader.readuntil(b'\n'), None
+    except asyncio.IncompleteReadError as e:
+        return e.partial, None
+    except asyncio.LimitOverrunError as e:
+        head = await reader.readexactly(e.consumed)
+
+    while True:
+        try:
+            await reader.readuntil(b'\n')
+            return None, head
+        except asyncio.IncompleteReadError:
+            return None, head
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+
+
+class _Connection:
+    """
+    A client connection and how many of its requests are still waiting for an answer
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.unanswered = 0
+        self.answered = asyncio.Event()
+
+
+class Server:
+    """
+    A long running server that keeps ICD9, ICD10 and Converter instances loaded
+    and answers lookups over a Unix socket or a localhost TCP port.
+
+    The protocol is one JSON array per line.
+    Request:  [id, target, method, [args...]]
+    Response: [id, 1, result] on success or [id, 0, error message] on failure
+
+    Requests from all connections are queued and answered in batches. Within a batch
+    identical requests (same target, method and arguments) are looked up once and the
+    answer is shared, and each connection gets one write for all of its answers.
+    Batches are answered on a worker thread so a large one does not stop the server
+    accepting connections and reading requests.
+    A client may close its side after its last request, the connection stays open until
+    every request on it has been answered.
+    """
+    def __init__(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 targets=('icd9', 'icd10', 'converter'), errorHandle="NoDx", max_batch=4096, data_path=None,
+                 limit=DEFAULT_LIMIT):
+        '''
+        path - unix socket path, if given host and port are ignored
+        targets - which of icd9, icd10 and converter to load and serve
+        errorHandle - passed through to ICD9 and ICD10, see ICD9.handleError
+        max_batch - the most requests answered in a single batch
+        data_path - passed through to ICD9, ICD10 and Converter
+        limit - longest request line in bytes, longer requests are answered with an error
+        '''
+        self.path = path
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.limit = limit
+
+        loaders = {
+            'icd9': lambda: ICD9(errorHandle, data_path),
+            'icd10': lambda: ICD10(errorHandle, data_path),
+            'converter': lambda: Converter(data_path),
+        }
+        self.__targets = {}
+        for name in targets:
+            if name not in loaders:
+                raise Exception('%s is not a valid server target' % name)
+            self.__targets[name] = loaders[name]()
+
+        self.__pending = None
+        self.__server = None
+        self.__batcher = None
+        self.__handlers = set()
+
+
+    """
+    Input: <string> target name, <string> method name, <list> arguments
+    Returns: the result of calling the method in process
+    Raises the same exceptions the ontology would plus unknown target/method errors
+    """
+    def call(self, target, method, args):
+        if not isinstance(args, list):
+            raise Exception('request arguments must be a list')
+
+        try:
+            obj = self.__targets[target]
+        except KeyError:
+            raise Exception('%s is not loaded on this server' % target)
+
+        if method not in METHODS[target]:
+            raise Exception('%s.%s() cannot be called remotely' % (target, method))
+
+        return getattr(obj, method)(*args)
+
+
+    async def start(self):
+        self.__pending = asyncio.Queue()
+        self.__batcher = asyncio.ensure_future(self.__batch_loop())
+
+        if self.path:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.__server = await asyncio.start_unix_server(self.__handle, path=self.path, limit=self.limit)
+        else:
+            self.__server = await asyncio.start_server(self.__handle, self.host, self.port, limit=self.limit)
+            # port 0 asks the OS for a free port, report the real one back
+            self.port = self.__server.sockets[0].getsockname()[1]
+
+
+    async def stop(self):
+        self.__server.close()
+        tasks = list(self.__handlers) + [self.__batcher]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.__server.wait_closed()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+    async def serve(self):
+        await self.start()
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.stop()
+
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+
+    async def __handle(self, reader, writer):
+        self.__handlers.add(asyncio.current_task())
+        connection = _Connection(writer)
+        try:
+            while True:
+                line, head = await _readline(reader)
+                if head is not None:
+                    writer.write(_encode([_request_id(head), 0,
+                                          'request is longer than the %d byte limit' % self.limit]))
+                    continue
+                if not line:
+                    break
+                connection.unanswered += 1
+                self.__pending.put_nowait((connection, line))
+
+            # the client has finished sending, answer everything it asked before closing
+            while connection.unanswered:
+                connection.answered.clear()
+                await connection.answered.wait()
+        except asyncio.CancelledError:
+            # stop() cancels the handlers, asyncio logs a traceback for any that end cancelled
+            pass
+        finally:
+            self.__handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+    async def __batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.__pending.get()]
+
+            # yield once so every connection with data ready gets to enqueue,
+            # then take everything waiting up to max_batch
+            await asyncio.sleep(0)
+            while len(batch) < self.max_batch and not self.__pending.empty():
+                batch.append(self.__pending.get_nowait())
+
+            responses = await loop.run_in_executor(None, self.__run_batch, batch)
+
+            # one write per connection for the whole batch
+            for connection, lines in responses.items():
+                writer = connection.writer
+                if not writer.is_closing():
+                    writer.write(b''.join(lines))
+                    try:
+                        await writer.drain()
+                    except ConnectionError:
+                        pass
+                connection.unanswered -= len(lines)
+                connection.answered.set()
+
+
+    def __run_batch(self, batch):
+        """
+        Returns {connection: [encoded responses]}.
+        Requests that only differ by id are looked up once.
+        """
+        answers = {}
+        responses = {}
+        for connection, line in batch:
+            request_id = None
+            try:
+                request_id, target, method, args = json.loads(line)
+                key = json.dumps([target, method, args])
+                try:
+                    ok, result = answers[key]
+                except KeyError:
+                    ok, result = answers[key] = self.__answer(target, method, args)
+                response = _encode([request_id, ok, result])
+            except Exception as e:
+                response = _encode([request_id, 0, str(e)])
+            responses.setdefault(connection, []).append(response)
+        return responses
+
+
+    def __answer(self, target, method, args):
+        try:
+            return 1, self.call(target, method, args)
+        except Exception as e:
+            return 0, str(e)
+
+
+class AsyncClient:
+    """
+    asyncio client for Server.
+    Requests are written as soon as they are made and matched to responses by id,
+    so many calls can be in flight on one connection at the same time.
+
+    client = AsyncClient(path='/tmp/dxcodehandler.sock')
+    await client.connect()
+    await client.call('icd9', 'ancestors', 'E810')
+    await client.map('converter', 'convert_10_9', ['S15.121S', 'T41.3X1A'])
+    """
+    def __init__(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT, limit=DEFAULT_LIMIT):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.limit = limit
+        self.__ids = itertools.count()
+        self.__waiting = {}
+        self.__reader = None
+        self.__writer = None
+        self.__listener = None
+
+
+    async def connect(self):
+        if self.path:
+            self.__reader, self.__writer = await asyncio.open_unix_connection(self.path, limit=self.limit)
+        else:
+            self.__reader, self.__writer = await asyncio.open_connection(self.host, self.port, limit=self.limit)
+        self.__listener = asyncio.ensure_future(self.__listen())
+        return self
+
+
+    async def close(self):
+        self.__writer.close()
+        await self.__writer.wait_closed()
+        await self.__listener
+
+
+    async def __aenter__(self):
+        return await self.connect()
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    """
+    Input: <string> target, <string> method, any arguments for the method
+    Returns: the method result, raises Exception with the server's message on failure
+    """
+    async def call(self, target, method, *args):
+        return await self.send(target, method, *args)
+
+
+    """
+    Same as call() but returns the future without waiting for it.
+    Useful for pipelining many requests before gathering the answers.
+    """
+    def send(self, target, method, *args):
+        request_id = next(self.__ids)
+        future = asyncio.get_running_loop().create_future()
+        self.__waiting[request_id] = future
+        self.__writer.write(_encode([request_id, target, method, list(args)]))
+        return future
+
+
+    """
+    Input: <string> target, <string> method, <list> codes
+    Returns: <list> the method result for every code, in input order
+    """
+    async def map(self, target, method, codes, *args):
+        futures = [self.send(target, method, code, *args) for code in codes]
+        await self.__writer.drain()
+        return list(await asyncio.gather(*futures))
+
+
+    async def __listen(self):
+        try:
+            while True:
+                line, head = await _readline(self.__reader)
+                if head is not None:
+                    ok, request_id = 0, _request_id(head)
+                    result = 'response is longer than the %d byte limit' % self.limit
+                elif not line:
+                    break
+                else:
+                    request_id, ok, result = json.loads(line)
+                future = self.__waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(Exception(result))
+        finally:
+            for future in self.__waiting.values():
+                if not future.done():
+                    future.set_exception(Exception('connection to server closed'))
+            self.__waiting.clear()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve ICD9, ICD10 and Converter lookups')
+    parser.add_argument('--socket', help='unix socket path, overrides --host and --port')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--targets', default='icd9,icd10,converter',
+                        help='comma separated list of icd9, icd10, converter')
+    parser.add_argument('--error-handle', default='NoDx')
+    parser.add_argument('--data-path', help='directory laid out like "DxCodeHandler data"')
+    args = parser.parse_args(argv)
+
+    server = Server(path=args.socket, host=args.host, port=args.port,
+                    targets=args.targets.split(','), errorHandle=args.error_handle,
+                    data_path=args.data_path)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
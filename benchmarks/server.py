@@ -0,0 +1,121 @@
+"""
+Compares Server/AsyncClient lookups against calling the ontology in process.
+
+python -m DxCodeHandler.benchmarks.server --target icd9 --method ancestors
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from ..Server import Server, AsyncClient
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def summarise(latencies, elapsed):
+    return {
+        'calls': len(latencies),
+        'seconds': elapsed,
+        'calls_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+    }
+
+
+def bench_in_process(server, target, method, codes):
+    latencies = []
+    start = time.perf_counter()
+    for code in codes:
+        t = time.perf_counter()
+        try:
+            server.call(target, method, [code])
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - t)
+    return summarise(latencies, time.perf_counter() - start)
+
+
+async def bench_client(path, target, method, codes, concurrency):
+    latencies = []
+
+    async def timed(client, code):
+        t = time.perf_counter()
+        try:
+            await client.call(target, method, code)
+        except Exception:
+            pass
+        latencies.append(time.perf_counter() - t)
+
+    async with AsyncClient(path=path) as client:
+        start = time.perf_counter()
+        for i in range(0, len(codes), concurrency):
+            await asyncio.gather(*[timed(client, code) for code in codes[i:i + concurrency]])
+        elapsed = time.perf_counter() - start
+    return summarise(latencies, elapsed)
+
+
+def run(target='icd9', method='ancestors', calls=20000, concurrency=(1, 16, 256), seed=0):
+    path = os.path.join(tempfile.mkdtemp(), 'dxcodehandler.sock')
+    server = Server(path=path, targets=(target,))
+
+    if target == 'converter':
+        # the converter does not expose its code sets, read them from the depth tables
+        depths = 'icd9/depths2.json' if method == 'convert_9_10' else 'icd10/depths.json'
+        data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                 'DxCodeHandler data', depths)
+        universe = sorted(json.load(open(data_path)).keys())
+    else:
+        universe = sorted(server.call(target, 'getAllCodes', []))
+
+    rng = random.Random(seed)
+    codes = [rng.choice(universe) for _ in range(calls)]
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait()
+
+    results = {'target': target, 'method': method, 'in_process': bench_in_process(server, target, method, codes)}
+    for n in concurrency:
+        results['server_concurrency_%d' % n] = asyncio.run(bench_client(path, target, method, codes, n))
+
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    return results
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark Server against in process calls')
+    parser.add_argument('--target', default='icd9', choices=('icd9', 'icd10', 'converter'))
+    parser.add_argument('--method', default='ancestors')
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--concurrency', default='1,16,256')
+    args = parser.parse_args(argv)
+
+    results = run(args.target, args.method, args.calls,
+                  [int(n) for n in args.concurrency.split(',')])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
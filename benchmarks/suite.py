@@ -0,0 +1,313 @@
+"""
+Benchmarks construction and the lookup methods of ICD9, ICD10 and Converter.
+
+python -m DxCodeHandler.benchmarks.suite --output before.json
+python -m DxCodeHandler.benchmarks.suite --output after.json --compare before.json
+
+Runs on a synthetic ontology by default (see synthetic.py) so no CMS data is needed,
+pass --data packaged to run against the packaged data files instead.
+Results are written as JSON, every timing is the best of --repeat runs.
+"""
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ..ICD9 import ICD9
+from ..ICD10 import ICD10
+from ..Converter import Converter
+from ..Batch import BatchExecutor
+from ..Ingest import PACKAGED_DATA
+from . import synthetic
+
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+"""
+(name, class, data files it loads), ontologies with missing files are skipped:
+the packaged data has no ICD10 descriptions or descendants
+"""
+ONTOLOGIES = [
+    ('ICD9', ICD9, ['icd9/parents2.json', 'icd9/children.json', 'icd9/depths2.json',
+                    'icd9/descendants2.json', 'icd9/descriptions5.json']),
+    ('ICD10', ICD10, ['icd10/parents.json', 'icd10/children.json', 'icd10/depths.json',
+                      'icd10/descendants.json', 'icd10/descriptions.json']),
+]
+
+"""
+(method, extra arguments, accepts a list of codes)
+"""
+ONTOLOGY_METHODS = [
+    ('isCode', (), True),
+    ('parent', (), True),
+    ('children', (), True),
+    ('descendants', (), False),
+    ('abstract', (2,), True),
+    ('ancestors', (), True),
+    ('description', (), False),
+]
+
+"""
+(method, table of the codes sampled, table of renamed codes mixed into the sample)
+"""
+CONVERTER_METHODS = [
+    ('convert_9_10', 'icd9/depths2.json', None),
+    ('convert_10_9', 'icd10/depths.json', 'conversions/2017_conversion_table.json'),
+]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=PACKAGE_PATH,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _quiet(fn):
+    # Converter raises for codes without an equivalent, that is still a completed call
+    def call(*args):
+        try:
+            return fn(*args)
+        except Exception:
+            return None
+    return call
+
+
+def bench_construct(name, factory, repeat):
+    seconds = _best(factory, repeat)
+
+    gc.collect()
+    tracemalloc.start()
+    obj = factory()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return obj, {
+        'name': '%s.__init__' % name,
+        'seconds': seconds,
+        'peak_bytes': peak,
+        'retained_bytes': current,
+    }
+
+
+def bench_method(name, method, codes, args, repeat, batch):
+    """
+    Times one call per code, and one call with the whole list when the method takes lists
+    """
+    fn = _quiet(method)
+
+    def per_call():
+        for code in codes:
+            fn(code, *args)
+
+    seconds = _best(per_call, repeat)
+    results = [{
+        'name': '%s.call' % name,
+        'calls': len(codes),
+        'seconds': seconds,
+        'ns_per_code': seconds / len(codes) * 1e9,
+        'codes_per_second': len(codes) / seconds,
+    }]
+
+    if batch:
+        seconds = _best(lambda: fn(list(codes), *args), repeat)
+        results.append({
+            'name': '%s.batch' % name,
+            'calls': len(codes),
+            'seconds': seconds,
+            'ns_per_code': seconds / len(codes) * 1e9,
+            'codes_per_second': len(codes) / seconds,
+        })
+    return results
+
+
+def bench_batch(name, target, method, codes, repeat, workers):
+    """
+    Times BatchExecutor.map over codes in every mode, pools are started before timing.
+    Chunks are sized so every worker gets a few of them, "ran" is "inline" when the
+    executor could not use a pool (a single core host without --workers).
+    """
+    pool_size = workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(codes) // (pool_size * 4)))
+
+    results = []
+    for mode in ('inline', 'thread', 'process'):
+        with BatchExecutor(target, workers=workers, chunk_size=chunk_size, mode=mode) as batch:
+            batch.map(method, codes, default=None)
+            seconds = _best(lambda: batch.map(method, codes, default=None), repeat)
+            ran = 'inline' if batch.runs_inline(len(codes)) else mode
+        results.append({
+            'name': 'Batch.%s.%s.%s' % (mode, name, method),
+            'ran': ran,
+            'calls': len(codes),
+            'workers': pool_size,
+            'chunk_size': chunk_size,
+            'seconds': seconds,
+            'ns_per_code': seconds / len(codes) * 1e9,
+            'codes_per_second': len(codes) / seconds,
+        })
+    return results
+
+
+def sample_codes(codes, n, rng, invalid=0.05, renamed=(), renamed_fraction=0.05):
+    """
+    n codes drawn from codes with roughly the invalid fraction replaced by unknown codes,
+    so the handleError path is part of the measurement, and the renamed_fraction replaced
+    by codes from renamed, so is Converter's 2016 to 2017 remap.
+    """
+    codes = sorted(codes)
+    renamed = sorted(renamed)
+    sample = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < invalid:
+            sample.append('XX%d' % i)
+        elif renamed and roll < invalid + renamed_fraction:
+            sample.append(rng.choice(renamed))
+        else:
+            sample.append(rng.choice(codes))
+    return sample
+
+
+def _load(data_path, name):
+    with open(os.path.join(data_path, name)) as f:
+        return json.load(f)
+
+
+def run(data='synthetic', scale=1.0, calls=20000, repeat=5, seed=0, low_memory=False, executor=False, workers=None):
+    rng = random.Random(seed)
+    cleanup = None
+    if data == 'synthetic':
+        cleanup = tempfile.mkdtemp()
+        data_path = synthetic.generate(cleanup, scale=scale, seed=seed)
+    elif data == 'packaged':
+        data_path = PACKAGED_DATA
+    else:
+        data_path = data
+
+    results = []
+    skipped = []
+    for name, cls, files in ONTOLOGIES:
+        missing = [f for f in files if not os.path.exists(os.path.join(data_path, f))]
+        if missing:
+            sys.stderr.write('skipping %s, missing %s\n' % (name, ', '.join(missing)))
+            skipped.append(name)
+            continue
+
+        obj, result = bench_construct(name, lambda: cls(data_path=data_path, low_memory=low_memory), repeat)
+        results.append(result)
+
+        codes = sample_codes(obj.getAllCodes(), calls, rng)
+        for method, args, batch in ONTOLOGY_METHODS:
+            results += bench_method('%s.%s' % (name, method), getattr(obj, method), codes, args, repeat, batch)
+
+    converter, result = bench_construct('Converter', lambda: Converter(data_path=data_path, low_memory=low_memory), repeat)
+    results.append(result)
+    for method, source, renamed in CONVERTER_METHODS:
+        renamed = _load(data_path, renamed) if renamed else ()
+        codes = sample_codes(_load(data_path, source), calls, rng, renamed=renamed)
+        results += bench_method('Converter.%s' % method, getattr(converter, method), codes, (), repeat, False)
+        if executor:
+            results += bench_batch('Converter', converter, method, codes, repeat, workers)
+
+    if cleanup:
+        import shutil
+        shutil.rmtree(cleanup, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': sys.version,
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'data': data,
+            'scale': scale,
+            'calls': calls,
+            'repeat': repeat,
+            'seed': seed,
+            'low_memory': low_memory,
+            'skipped': skipped,
+            'executor': executor,
+            'workers': workers,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+"""
+Input: <dict> baseline results, <dict> new results, <float> allowed slowdown
+Returns: <list> of (name, metric, baseline, new, ratio) for every metric that got worse than threshold
+"""
+def compare(baseline, new, threshold=0.10):
+    old = dict((r['name'], r) for r in baseline['results'])
+    regressions = []
+    for result in new['results']:
+        before = old.get(result['name'])
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_bytes', 'retained_bytes'):
+            if metric in result and before.get(metric):
+                ratio = float(result[metric]) / before[metric]
+                if ratio > 1 + threshold:
+                    regressions.append((result['name'], metric, before[metric], result[metric], ratio))
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark ICD9, ICD10 and Converter')
+    parser.add_argument('--data', default='synthetic',
+                        help='synthetic, packaged or a directory laid out like "DxCodeHandler data"')
+    parser.add_argument('--scale', type=float, default=1.0, help='size of the synthetic ontology')
+    parser.add_argument('--calls', type=int, default=20000, help='codes looked up per method')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--low-memory', action='store_true', help='construct everything with low_memory=True')
+    parser.add_argument('--executor', action='store_true',
+                        help='also time BatchExecutor in inline, thread and process mode')
+    parser.add_argument('--workers', type=int, help='BatchExecutor pool size, defaults to the cpu count')
+    parser.add_argument('--output', help='write results here instead of stdout')
+    parser.add_argument('--compare', help='baseline results file, exits 1 on regression')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown before --compare reports a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.data, args.scale, args.calls, args.repeat, args.seed, args.low_memory,
+                  args.executor, args.workers)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for name, metric, before, after, ratio in regressions:
+            sys.stderr.write('%s %s: %.6g -> %.6g (x%.2f)\n' % (name, metric, before, after, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Generates a synthetic "DxCodeHandler data" directory so the benchmarks can run
+without the CMS derived data files.
+
+The trees follow the shape of the real ontologies: a few chapters at depth 1,
+a wide fan-out into categories and then short runs of subcodes below them.
+Fan-out and depth per level are taken from the packaged ICD9 and ICD10 tables.
+"""
+import json
+import os
+import random
+import string
+
+from .. import Memory
+
+
+"""
+(low, high) number of children per node at each depth, depth 1 is the list of chapters.
+A low of 0 lets some nodes be leaves, which is how the real trees thin out below the
+category level. A scale of 1 gives trees close to the real sizes
+(~17k ICD9 codes, ~90k ICD10 codes). The scale multiplies the number of chapters only,
+so the number of codes grows linearly with it and the shape below the chapters is kept.
+"""
+ICD9_FANOUT = [(19, 19), (6, 14), (3, 10), (0, 12), (0, 2)]
+ICD10_FANOUT = [(23, 23), (6, 20), (3, 10), (2, 9), (0, 3), (0, 3), (0, 3)]
+
+SUFFIXES = string.digits + string.ascii_uppercase
+
+
+def _code(prefix, parent, index, depth, width):
+    if parent is None:
+        return '%s%0*d' % (prefix, width, index)
+    suffix = ''
+    for _ in range(width):
+        index, digit = divmod(index, len(SUFFIXES))
+        suffix = SUFFIXES[digit] + suffix
+    # separate the category from its subcodes with a dot like the real ontologies
+    return parent + ('.' if depth == 4 else '') + suffix
+
+
+def generate_ontology(fanout, rng, scale=1.0, prefix='S'):
+    """
+    Returns parents, children, depths, descendants (excluding the code itself) and descriptions dicts
+    """
+    parents = {}
+    children = {}
+    depths = {}
+
+    level = [None]
+    for depth, (low, high) in enumerate(fanout, 1):
+        next_level = []
+        if depth == 1:
+            low = high = max(1, int(round(high * scale)))
+            width = max(2, len(str(high - 1)))
+        else:
+            width = 1 if high <= len(SUFFIXES) else 2
+        # every code at one depth has the same length, so codes at different depths can never collide
+        for parent in level:
+            n = rng.randint(low, high)
+            kids = [_code(prefix, parent, i, depth, width) for i in range(n)]
+            for kid in kids:
+                depths[kid] = depth
+                if parent is not None:
+                    parents[kid] = parent
+            if parent is not None and kids:
+                children[parent] = kids
+            next_level += kids
+        level = next_level
+
+    # breadth first, the order the packaged descendants tables use
+    descendants = dict((code, Memory.descendants(children, code)) for code in depths)
+
+    descriptions = dict((code, 'Synthetic diagnosis %s at depth %d' % (code, depth))
+                        for code, depth in depths.items())
+    return parents, children, depths, descendants, descriptions
+
+
+def generate_gems(source, target, rng, no_dx=0.02, cui=0.03, unmapped=0.05):
+    """
+    Maps each source code to 1-3 target codes, mostly one to one like the CMS GEMs.
+    Returns the GEM table and a smaller CUI fallback table for codes missing from it.
+    """
+    target = sorted(target)
+    gem = {}
+    cui_table = {}
+    for code in sorted(source):
+        roll = rng.random()
+        if roll < unmapped:
+            continue
+        elif roll < unmapped + cui:
+            cui_table[code] = [rng.choice(target)]
+        elif roll < unmapped + cui + no_dx:
+            gem[code] = ['NoD.x']
+        else:
+            n = rng.choice((1, 1, 1, 1, 1, 2, 2, 3))
+            gem[code] = rng.sample(target, n)
+    return gem, cui_table
+
+
+def generate(path, scale=1.0, seed=0):
+    """
+    Writes every file read by ICD9, ICD10 and Converter into path.
+    Returns path so it can be passed straight to the data_path arguments.
+    """
+    rng = random.Random(seed)
+
+    icd9 = generate_ontology(ICD9_FANOUT, rng, scale, prefix='N')
+    icd10 = generate_ontology(ICD10_FANOUT, rng, scale, prefix='T')
+
+    icd9_to_10, icd9_cui = generate_gems(icd9[2], icd10[2], rng)
+    icd10_to_9, icd10_cui = generate_gems(icd10[2], icd9[2], rng)
+
+    # a small number of 2016 codes renamed in 2017, the dash keeps the old names out of the tree
+    icd10_codes = sorted(icd10[2])
+    remapped = rng.sample(icd10_codes, max(1, len(icd10_codes) // 200))
+    conversion_table = dict((code + '-16', code) for code in remapped)
+
+    files = {
+        'icd9/parents2.json': icd9[0],
+        'icd9/children.json': icd9[1],
+        'icd9/depths2.json': icd9[2],
+        'icd9/descendants2.json': icd9[3],
+        'icd9/descriptions5.json': icd9[4],
+        'icd10/parents.json': icd10[0],
+        'icd10/children.json': icd10[1],
+        'icd10/depths.json': icd10[2],
+        'icd10/descendants.json': icd10[3],
+        'icd10/descriptions.json': icd10[4],
+        'conversions/icd9_2_icd10_conversion.json': icd9_to_10,
+        'conversions/icd9_cui_icd10.json': icd9_cui,
+        'conversions/icd10_2_icd9_conversion_2017.json': icd10_to_9,
+        'conversions/icd10_cui_icd9.json': icd10_cui,
+        'conversions/2017_conversion_table.json': conversion_table,
+    }
+    for name, table in files.items():
+        filename = os.path.join(path, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            json.dump(table, f)
+
+    return path
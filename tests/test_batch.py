@@ -0,0 +1,44 @@
+import pytest
+
+from ..ICD9 import ICD9
+from ..Converter import Converter
+from ..Batch import BatchExecutor
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return Converter()
+
+
+@pytest.fixture(scope='module')
+def codes():
+    return sorted(ICD9().getAllCodes())[:3000] + ['XX1']
+
+
+def converted(converter, code):
+    try:
+        return converter.convert_9_10(code)
+    except Exception:
+        return None
+
+
+@pytest.mark.parametrize('mode', ['auto', 'inline', 'thread', 'process'])
+def test_map_matches_in_process(converter, codes, mode):
+    with BatchExecutor(converter, workers=2, chunk_size=500, mode=mode) as batch:
+        assert batch.map('convert_9_10', codes, default=None) == [converted(converter, code) for code in codes]
+
+
+def test_map_raises_without_default(converter):
+    with pytest.raises(Exception, match='cannot be converted'):
+        BatchExecutor(converter).map('convert_9_10', ['001.0', 'XX1'])
+
+
+def test_returned_lists_are_copies(converter):
+    icd9 = ICD9()
+    converter.convert_9_10('001.0').append('changed')
+    icd9.children('001').append('changed')
+    icd9.descendants('001').append('changed')
+
+    assert 'changed' not in converter.convert_9_10('001.0')
+    assert 'changed' not in icd9.children('001')
+    assert 'changed' not in icd9.descendants('001')
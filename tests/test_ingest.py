@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+from .. import Ingest
+
+
+def packaged(name):
+    with open(os.path.join(Ingest.PACKAGED_DATA, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def output(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('ingest'))
+    Ingest.build(output_path=path)
+    return path
+
+
+def built(output, name):
+    with open(os.path.join(output, name)) as f:
+        return json.load(f)
+
+
+def test_conversion_table_matches_packaged(output):
+    table = built(output, 'conversions/2017_conversion_table.json')
+    shipped = packaged('conversions/2017_conversion_table.json')
+    current = packaged('icd10/depths.json')
+
+    # "None" is a placeholder row in the NCHS file, not a code
+    shipped.pop('None')
+    for previous, code in shipped.items():
+        if previous in current:
+            assert previous not in table
+        else:
+            assert table[previous] == code.strip()
+    assert not [key for key in table if key in current]
+
+
+def test_conversion_table_skips_combinations_and_expands_ranges(output):
+    table = built(output, 'conversions/2017_conversion_table.json')
+
+    # "G56.01 and G56.02", "I63.011 AND I63.012" replace a combination of codes still in use
+    for code in ('G56.01', 'G56.02', 'I63.011', 'I63.012', 'K59.00'):
+        assert code not in table
+    # "I60.20-I60.22"
+    assert [table[code] for code in ('I60.20', 'I60.21', 'I60.22')] == ['I60.2'] * 3
+
+
+def test_icd10_2_icd9_matches_packaged(output):
+    table = built(output, 'conversions/icd10_2_icd9_conversion_2017.json')
+    shipped = packaged('conversions/icd10_2_icd9_conversion_2017.json')
+
+    assert set(table) == set(shipped)
+    for code, targets in shipped.items():
+        assert sorted(table[code]) == sorted(set(targets))
+
+
+def test_icd9_2_icd10_matches_packaged(output):
+    table = built(output, 'conversions/icd9_2_icd10_conversion.json')
+    shipped = packaged('conversions/icd9_2_icd10_conversion.json')
+
+    for code, targets in shipped.items():
+        # the packaged table spells four character E codes "E961.", the ontology "E961"
+        code = code.rstrip('.')
+        assert sorted(table[code]) == sorted(set(targets))
+    assert len(table) == len(shipped)
+
+
+def test_flags_line_up_with_targets(output):
+    table = built(output, 'conversions/icd10_2_icd9_conversion_2017.json')
+    flags = built(output, 'conversions/icd10_2_icd9_flags_2017.json')
+
+    assert set(table) == set(flags)
+    for code in table:
+        assert len(table[code]) == len(flags[code])
+    assert table['T46.4X6S'] == ['NoD.x']
+    assert flags['T46.4X6S'][0][Ingest.NO_MAP] == '1'
+
+
+"""
+Codes where the packaged descriptions5.json differs from the CMS descriptions: unaccented
+spellings without the apostrophe, and E codes holding the description of a neighbouring code
+"""
+PACKAGED_DESCRIPTION_ERRORS = set([
+    '041.3', '386.00', '386.01', '386.02', '386.03', '386.04', 'E029.9', 'E845.9', 'E850.9',
+    'E855.9', 'E866.9', 'E881.1', 'E882', 'E886.9', 'E891.9', 'E893.9', 'E898.1', 'E902.9',
+    'E903', 'E906.9', 'E907', 'E910.9', 'E913.9', 'E917.9', 'E953.9', 'E955.9', 'E958.9',
+    'E962.9', 'E965.9', 'E968.9', 'E983.9', 'E984', 'E985.7', 'E988.9',
+])
+
+
+def test_descriptions_match_packaged(output):
+    descriptions = built(output, 'icd9/descriptions5.json')
+    shipped = packaged('icd9/descriptions5.json')
+
+    assert set(descriptions) == set(shipped)
+    assert set(code for code in shipped if descriptions[code] != shipped[code]) == PACKAGED_DESCRIPTION_ERRORS
+    assert descriptions['001.0'] == 'Cholera due to Vibrio Cholerae'
+    assert descriptions['339.3'] == 'Drug Induced Headache'
+    assert descriptions['E968.9'] == 'Assault by Unspecified Means'
+
+
+def test_incremental_rebuild(output):
+    assert Ingest.build(output_path=output) == []
+    os.remove(os.path.join(output, 'conversions/icd9_2_icd10_flags.json'))
+    assert Ingest.build(output_path=output) == ['icd9_2_icd10']
+
+
+def test_output_path_required():
+    with pytest.raises(Exception, match='in_place'):
+        Ingest.build()
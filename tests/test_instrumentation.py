@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+from .. import Ingest
+from .. import Instrumentation
+from ..ICD9 import ICD9
+from ..Converter import Converter
+
+
+def packaged(name):
+    with open(os.path.join(Ingest.PACKAGED_DATA, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return {
+        'gem': packaged('conversions/icd10_2_icd9_conversion_2017.json'),
+        'cui': packaged('conversions/icd10_cui_icd9.json'),
+        'remap': packaged('conversions/2017_conversion_table.json'),
+        'codes': packaged('icd10/depths.json'),
+    }
+
+
+def test_list_input_counts_one_call():
+    recorder = Instrumentation.Instrumentation()
+    icd9 = Instrumentation.instrument(ICD9(), recorder)
+
+    icd9.parent(['001.0', 'XX1', 'XX2', '001.1'])
+    icd9.parent('XX3')
+    icd9.isLeafNode('001.0')
+
+    methods = recorder.snapshot()['methods']
+    # isCode() and handleError() are called for every code, but only the outer call counts
+    assert methods['ICD9.parent']['calls'] == 2
+    assert methods['ICD9.parent']['invalid'] == 3
+    assert methods['ICD9.parent']['invalid_rate'] == 1.5
+    assert methods['ICD9.parent']['exceptions'] == 0
+    assert sum(methods['ICD9.parent']['histogram']) == 2
+    # isLeafNode() calls children(), which is not counted separately
+    assert set(methods) == set(['ICD9.parent', 'ICD9.isLeafNode'])
+
+
+def test_exceptions_are_counted():
+    recorder = Instrumentation.Instrumentation()
+    icd9 = Instrumentation.instrument(ICD9(), recorder)
+
+    with pytest.raises(Exception):
+        icd9.abstract('001.0', 'two')
+
+    assert recorder.snapshot()['methods']['ICD9.abstract']['exceptions'] == 1
+
+
+def test_conversion_paths(tables):
+    recorder = Instrumentation.Instrumentation()
+    converter = Instrumentation.instrument(Converter(), recorder)
+
+    gem = sorted(code for code, targets in tables['gem'].items() if targets[0] != 'NoD.x')[0]
+    no_dx = sorted(code for code, targets in tables['gem'].items() if targets[0] == 'NoD.x')[0]
+    cui = sorted(code for code in tables['cui'] if code not in tables['gem'])[0]
+    failure = sorted(code for code in tables['codes']
+                     if code not in tables['gem'] and code not in tables['cui'] and code not in tables['remap'])[0]
+    remap = sorted(code for code, current in tables['remap'].items() if current in tables['gem'])[0]
+
+    converter.convert_10_9(gem)
+    converter.convert_10_9(cui)
+    converter.convert_10_9(remap)
+    for code in (no_dx, failure):
+        with pytest.raises(Exception):
+            converter.convert_10_9(code)
+
+    snapshot = recorder.snapshot()
+    # the remapped code is then answered by the GEM
+    assert snapshot['conversions']['Converter.convert_10_9'] == {
+        'gem': 2, 'cui': 1, 'no_dx': 1, 'failure': 1, 'remap': 1}
+    assert snapshot['methods']['Converter.convert_10_9']['calls'] == 5
+    assert snapshot['methods']['Converter.convert_10_9']['exceptions'] == 2
+
+
+def test_snapshot_reset_and_reset():
+    recorder = Instrumentation.Instrumentation()
+    icd9 = Instrumentation.instrument(ICD9(), recorder)
+
+    icd9.isCode('001.0')
+    first = recorder.snapshot(reset=True)
+    assert first['methods']['ICD9.isCode']['calls'] == 1
+    assert recorder.snapshot()['methods'] == {}
+
+    icd9.isCode('001.0')
+    # a snapshot is a copy, later calls do not change it
+    assert first['methods']['ICD9.isCode']['calls'] == 1
+    recorder.reset()
+    assert recorder.snapshot() == {'buckets': list(recorder.buckets), 'methods': {}, 'conversions': {}}
+
+
+def test_module_level_default():
+    Instrumentation.reset()
+    icd9 = Instrumentation.instrument(ICD9())
+    icd9.depth('001.0')
+    assert Instrumentation.snapshot(reset=True)['methods']['ICD9.depth']['calls'] == 1
+    assert Instrumentation.snapshot()['methods'] == {}
+    Instrumentation.uninstrument(icd9)
+
+
+def test_uninstrument_restores_methods():
+    recorder = Instrumentation.Instrumentation()
+    icd9 = ICD9()
+    converter = Converter()
+    originals = dict((name, getattr(type(icd9), name)) for name in Instrumentation.METHODS['ICD9'] + ('handleError',))
+
+    Instrumentation.instrument(icd9, recorder)
+    Instrumentation.instrument(converter, recorder)
+    Instrumentation.uninstrument(icd9)
+    Instrumentation.uninstrument(converter)
+
+    for name, method in originals.items():
+        assert getattr(icd9, name).__func__ is method
+    assert converter.convert_9_10.__func__ is Converter.convert_9_10
+    assert converter.instrumentation is None
+
+    icd9.parent(['001.0', 'XX1'])
+    converter.convert_9_10('001.0')
+    assert recorder.snapshot() == {'buckets': list(recorder.buckets), 'methods': {}, 'conversions': {}}
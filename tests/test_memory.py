@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from .. import Ingest
+from ..ICD9 import ICD9
+from ..ICD10 import ICD10
+from ..Converter import Converter
+from ..benchmarks import synthetic
+
+
+ONTOLOGY_METHODS = ['descendants', 'children', 'parent', 'ancestors', 'description', 'isLeafNode']
+
+
+def answers(method, code):
+    try:
+        return method(code)
+    except Exception as e:
+        return ('raised', str(e))
+
+
+def assert_same_answers(default, low, methods, codes):
+    for name in methods:
+        default_method, low_method = getattr(default, name), getattr(low, name)
+        for code in codes:
+            assert answers(low_method, code) == answers(default_method, code), (name, code)
+
+
+@pytest.fixture(scope='module')
+def synthetic_data(tmp_path_factory):
+    return synthetic.generate(str(tmp_path_factory.mktemp('synthetic')), scale=0.2)
+
+
+def test_icd9_low_memory_matches_default():
+    default, low = ICD9(), ICD9(low_memory=True)
+    codes = sorted(default.getAllCodes())
+
+    assert_same_answers(default, low, ONTOLOGY_METHODS, codes)
+    for code in codes:
+        assert low.abstract(code, 2) == default.abstract(code, 2), code
+    # E979 is one of the codes whose children the packaged children table leaves out
+    assert len(low.descendants('E979')) == 10
+
+
+def test_icd10_low_memory_matches_default(synthetic_data):
+    default, low = ICD10(data_path=synthetic_data), ICD10(data_path=synthetic_data, low_memory=True)
+    assert_same_answers(default, low, ONTOLOGY_METHODS, sorted(default.getAllCodes()))
+
+
+def test_converter_low_memory_matches_default():
+    default, low = Converter(), Converter(low_memory=True)
+    codes = sorted(ICD9().getAllCodes())
+    assert_same_answers(default, low, ['convert_9_10'], codes)
+
+    with open(os.path.join(Ingest.PACKAGED_DATA, 'conversions/icd10_2_icd9_conversion_2017.json')) as f:
+        codes = sorted(json.load(f))
+    assert_same_answers(default, low, ['convert_10_9'], codes)
+
+
+def test_low_memory_uses_less():
+    assert ICD9(low_memory=True).memory_report()['total'] < ICD9().memory_report()['total']
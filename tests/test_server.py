@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+import pytest
+
+from ..ICD9 import ICD9
+from ..Server import Server, AsyncClient
+
+
+@pytest.fixture(scope='module')
+def icd9():
+    return ICD9()
+
+
+def serve(coroutine, client=True, **kwargs):
+    """
+    Runs coroutine(client, server) against a server on a fresh unix socket,
+    or coroutine(path, server) when client is False
+    """
+    path = os.path.join(tempfile.mkdtemp(), 'dx.sock')
+    server = Server(path=path, targets=('icd9',), **kwargs)
+
+    async def run():
+        await server.start()
+        try:
+            if not client:
+                return await coroutine(path, server)
+            async with AsyncClient(path=path) as connected:
+                return await coroutine(connected, server)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def test_round_trip_matches_in_process(icd9):
+    async def run(client, server):
+        return await client.map('icd9', 'ancestors', ['E810', '240', 'E810'])
+
+    assert serve(run) == [icd9.ancestors('E810'), icd9.ancestors('240'), icd9.ancestors('E810')]
+
+
+def test_response_longer_than_64k(icd9):
+    async def run(client, server):
+        return await client.call('icd9', 'getAllCodes')
+
+    assert set(serve(run)) == icd9.getAllCodes()
+
+
+def test_request_longer_than_64k(icd9):
+    codes = sorted(icd9.getAllCodes())[:12000]
+
+    async def run(client, server):
+        return await client.call('icd9', 'parent', codes)
+
+    assert sorted(serve(run)) == sorted(icd9.parent(codes))
+
+
+def test_oversized_request_fails_alone():
+    async def run(client, server):
+        too_long = client.send('icd9', 'isCode', 'E' * 4096)
+        after = client.send('icd9', 'isCode', 'E810')
+        with pytest.raises(Exception, match='longer than'):
+            await too_long
+        return await after
+
+    assert serve(run, limit=1024) is True
+
+
+def test_errors_are_raised_by_client():
+    async def run(client, server):
+        with pytest.raises(Exception, match='not loaded'):
+            await client.call('converter', 'convert_9_10', '001.0')
+        with pytest.raises(Exception, match='cannot be called remotely'):
+            await client.call('icd9', 'handleError', '001.0')
+        return await client.call('icd9', 'isCode', 'E810')
+
+    assert serve(run) is True
+
+
+def test_half_closed_connection_is_answered(icd9):
+    async def run(path, server):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'[0,"icd9","isCode",["E810"]]\n[1,"icd9","parent",["E810"]]\n')
+        writer.write_eof()
+        lines = (await reader.read()).splitlines()
+        writer.close()
+        return [json.loads(line) for line in lines]
+
+    assert serve(run, client=False) == [[0, 1, True], [1, 1, icd9.parent('E810')]]
+
+
+def test_arguments_must_be_a_list():
+    async def run(path, server):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'[0,"icd9","isCode",{"E810":1}]\n[1,"icd9","isCode","E810"]\n')
+        writer.write_eof()
+        lines = (await reader.read()).splitlines()
+        writer.close()
+        return [json.loads(line) for line in lines]
+
+    assert serve(run, client=False) == [[0, 0, 'request arguments must be a list'],
+                                        [1, 0, 'request arguments must be a list']]
+
+
+def test_stop_with_open_connections(caplog):
+    async def run(path, server):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'[0,"icd9","getAllCodes",[]]\n')
+        await asyncio.sleep(0.01)
+
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        serve(run, client=False)
+    assert not caplog.records